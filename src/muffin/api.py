@@ -0,0 +1,113 @@
+import argparse
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from muffin.constant import LOGGING_LEVEL
+from muffin.embedding import load_embedding_model
+from muffin.main import generate_answer_stream, get_collection, retrieve_recipe
+from muffin.models import get_recipe_by_id
+from muffin.query_log import QueryLogEntry, log_query
+from muffin.utils import normalize_prompt
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=LOGGING_LEVEL)
+
+
+class GenerateRequest(BaseModel):
+    prompt: str
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Open ChromaDB and load the embedding model before the first request
+    # rather than during it
+    get_collection()
+    load_embedding_model()
+    yield
+
+
+app = FastAPI(title="MC Muffin", lifespan=lifespan)
+
+
+def server_sent_event(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/health")
+def health() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/search")
+def search(q: str, n: int = Query(default=1, ge=1, le=20)) -> dict:
+    """Recherche seule : la recette la plus proche et les n plus proches ids."""
+    if not normalize_prompt(q):
+        raise HTTPException(status_code=422, detail="Empty query")
+    retrieval = retrieve_recipe(normalize_prompt(q), n_results=n)
+    return asdict(retrieval)
+
+
+@app.get("/recipes/{recipe_id}")
+def recipe(recipe_id: int) -> dict:
+    try:
+        return asdict(get_recipe_by_id(recipe_id))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/generate")
+def generate(request: GenerateRequest) -> StreamingResponse:
+    """
+    Recherche puis génération, en server-sent events :
+    un évènement "recipe", des évènements "token" puis "done".
+    """
+    if not normalize_prompt(request.prompt):
+        raise HTTPException(status_code=422, detail="Empty prompt")
+
+    def events() -> Iterator[str]:
+        start = time.perf_counter()
+        retrieval = retrieve_recipe(normalize_prompt(request.prompt))
+        log_entry = QueryLogEntry(
+            prompt=normalize_prompt(request.prompt),
+            recipe_ids=retrieval.recipe_ids,
+            distances=retrieval.distances,
+            retrieval_ms=retrieval.latency_ms,
+        )
+        yield server_sent_event(
+            "recipe", {"id": retrieval.recipe.id, "title": retrieval.recipe.title}
+        )
+
+        for token in generate_answer_stream(
+            request.prompt, retrieval.recipe, log_entry
+        ):
+            yield server_sent_event("token", token)
+
+        log_entry.total_ms = (time.perf_counter() - start) * 1000
+        log_query(log_entry)
+        yield server_sent_event("done", {"total_ms": log_entry.total_ms})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def run_api() -> None:
+    parser = argparse.ArgumentParser(description="Serve the MC Muffin HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Each worker process loads its own embedding model and ChromaDB client",
+    )
+    args = parser.parse_args()
+
+    uvicorn.run("muffin.api:app", host=args.host, port=args.port, workers=args.workers)
@@ -1,10 +1,20 @@
 import logging
 import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 import streamlit as st
 
 from muffin.constant import LOGGING_LEVEL
-from muffin.main import main
+from muffin.main import (
+    Retrieval,
+    build_messages,
+    follow_up,
+    generate_answer,
+    retrieve_recipe,
+)
+from muffin.query_log import QueryLogEntry, log_query
+from muffin.utils import normalize_prompt
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=LOGGING_LEVEL)
@@ -19,12 +29,56 @@ WAINTING_URLS = [
 ]
 WAINTING_URL = random.choice(WAINTING_URLS)
 
+# Number of prefetched retrievals kept in the session
+PREFETCH_CACHE_SIZE = 8
+# Typing pause after which the prompt is sent and its recipe searched
+PROMPT_DEBOUNCE = "400ms"
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Pool partagé par toutes les sessions pour la recherche en arrière-plan."""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def prefetch_recipe(user_prompt: str) -> "Future[Retrieval]":
+    """Lance (une seule fois par prompt normalisé) la recherche de la recette."""
+    prefetched: dict[str, Future[Retrieval]] = st.session_state.setdefault(
+        "prefetched", {}
+    )
+    key = normalize_prompt(user_prompt)
+    future = prefetched.get(key)
+    # A failed retrieval is retried instead of re-raising for the whole session
+    if future is None or (future.done() and future.exception() is not None):
+        prefetched.pop(key, None)
+        prefetched[key] = get_executor().submit(retrieve_recipe, key)
+        while len(prefetched) > PREFETCH_CACHE_SIZE:
+            prefetched.pop(next(iter(prefetched)))
+    return prefetched[key]
+
+
+def on_prompt_change() -> None:
+    # Called after each PROMPT_DEBOUNCE typing pause (live text input), so the
+    # recipe of the last prompt typed is usually found before the button is clicked
+    if normalize_prompt(st.session_state.user_prompt):
+        prefetch_recipe(st.session_state.user_prompt)
+
+
 st.set_page_config(page_title=BOT_NAME, page_icon="🧁")
 
 st.title(f"🧁 {BOT_NAME}")
 st.subheader("Yo ! Dis-moi ce qu'il y a dans ton frigo !")
 
-user_prompt = st.text_input("Ingrédients (ex: chocolat, banane...)", "")
+user_prompt = st.text_input(
+    "Ingrédients (ex: chocolat, banane...)",
+    "",
+    key="user_prompt",
+    on_change=on_prompt_change,
+    live=PROMPT_DEBOUNCE,
+    help="La recette est cherchée pendant que tu tapes.",
+)
+
+matched_recipe = st.empty()
 
 placeholder = st.empty()
 
@@ -34,9 +88,78 @@ if st.button("Trouver un muffin"):
             with st.spinner(f"{BOT_NAME} réfléchit..."):
                 st.video(WAINTING_URL, loop=True, autoplay=True, muted=True)
 
-                result = main(user_prompt)
+                start = time.perf_counter()
+                future = prefetch_recipe(user_prompt)
+                prefetch_hit = future.done()
+                retrieval = future.result()
+
+                log_entry = QueryLogEntry(
+                    prompt=normalize_prompt(user_prompt),
+                    recipe_ids=retrieval.recipe_ids,
+                    distances=retrieval.distances,
+                    retrieval_ms=retrieval.latency_ms,
+                    prefetch_hit=prefetch_hit,
+                )
+                result = generate_answer(user_prompt, retrieval.recipe, log_entry)
+                log_entry.total_ms = (time.perf_counter() - start) * 1000
+                log_query(log_entry)
 
         placeholder.empty()
-        st.markdown(result)
+
+        # A new search starts a new conversation around the retrieved recipe
+        st.session_state.retrieval = retrieval
+        st.session_state.messages = build_messages(
+            user_prompt, str(retrieval.recipe)
+        ) + [{"role": "assistant", "content": result}]
+        st.session_state.chat_history = [
+            {"role": "user", "content": user_prompt},
+            {"role": "assistant", "content": result},
+        ]
     else:
         st.warning("Veuillez entrer des ingrédients.")
+
+for message in st.session_state.get("chat_history", []):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
+if st.session_state.get("messages"):
+    if follow_up_prompt := st.chat_input("Une autre question ? (ex: et sans œufs ?)"):
+        with st.chat_message("user"):
+            st.markdown(follow_up_prompt)
+
+        with st.chat_message("assistant"):
+            with st.spinner(f"{BOT_NAME} réfléchit..."):
+                start = time.perf_counter()
+                answer = follow_up(st.session_state.messages, follow_up_prompt)
+                generation_ms = (time.perf_counter() - start) * 1000
+            st.markdown(answer)
+
+        # Only kept once Ollama has answered, like the messages sent to the model
+        st.session_state.chat_history += [
+            {"role": "user", "content": follow_up_prompt},
+            {"role": "assistant", "content": answer},
+        ]
+
+        # Follow-ups reuse the recipe already retrieved
+        retrieval = st.session_state.retrieval
+        log_query(
+            QueryLogEntry(
+                prompt=normalize_prompt(follow_up_prompt),
+                kind="follow_up",
+                recipe_ids=retrieval.recipe_ids,
+                distances=retrieval.distances,
+                generation_ms=generation_ms,
+                total_ms=generation_ms,
+            )
+        )
+
+# At the very end so that the page is already displayed while the prefetch finishes
+prefetched_retrieval = st.session_state.get("prefetched", {}).get(
+    normalize_prompt(user_prompt)
+)
+if prefetched_retrieval is not None:
+    wait([prefetched_retrieval])
+    if prefetched_retrieval.exception() is None:
+        matched_recipe.caption(
+            f"🧁 Recette trouvée : {prefetched_retrieval.result().recipe.title}"
+        )
@@ -1,4 +1,5 @@
 import logging
+import os
 
 LOGGING_LEVEL = logging.INFO
 
@@ -6,3 +7,22 @@ RAW_RECIPE_FOLDER = "data/raw_recipes/"
 
 COLLECTION_NAME = "muffin_lover"
 CHROMADB_PATH = "data/chromadb/"
+
+# One of "torch", "onnx" or "int8", see muffin.embedding
+EMBEDDING_BACKEND = os.getenv("MUFFIN_EMBEDDING_BACKEND", "torch")
+
+LLM_MODEL = "mistral"
+# How long Ollama keeps the model (and the conversation prefix) in memory after a call
+OLLAMA_KEEP_ALIVE = "30m"
+# Same value on every call, otherwise Ollama reloads the model. Room for the system
+# prompt, the recipe, the first rap and CHAT_MAX_TURNS follow-ups
+OLLAMA_NUM_CTX = 8192
+CHAT_MAX_TURNS = 4
+
+# Bump it when the system prompt or the LLM changes, older pre-generated answers are then ignored
+PREGENERATION_VERSION = 2
+
+# Kept apart from recipes.db so that the serving writes never lock the recipes
+QUERY_LOG_PATH = os.getenv("MUFFIN_QUERY_LOG_PATH", "data/query_log.db")
+
+SNAPSHOT_FOLDER = "data/snapshot/"
@@ -0,0 +1,205 @@
+import logging
+import time
+from functools import lru_cache
+
+import numpy as np
+import torch
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer, PreTrainedTokenizerBase
+
+from muffin.constant import EMBEDDING_BACKEND, LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=LOGGING_LEVEL)
+
+
+EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-small"
+
+# torch : full precision PyTorch (baseline)
+# onnx  : ONNX Runtime, needs the "onnx" extra (pip install ".[onnx]")
+# int8  : PyTorch with Linear layers dynamically quantized to int8
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+
+# The e5 models are trained with these prefixes, see the model card
+QUERY_PREFIX = "query: "
+PASSAGE_PREFIX = "passage: "
+# Collection metadata flag, indexes built before the prefixes were added don't have it
+PREFIXED_METADATA_KEY = "e5_prefixes"
+EMBEDDING_BATCH_SIZE = 64
+
+SAMPLE_QUERIES = [
+    "chocolat, banane",
+    "myrtilles et citron",
+    "pomme cannelle",
+    "fromage, jambon",
+    "framboise chocolat blanc",
+    "noix de coco",
+    "courgette et feta",
+    "pépites de chocolat",
+    "carotte, noix",
+    "sans oeufs ni lait",
+]
+
+
+def check_backend(backend: str) -> None:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend : {backend} (expected one of {EMBEDDING_BACKENDS})"
+        )
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer() -> PreTrainedTokenizerBase:
+    """Charge le tokenizer une seule fois, il est partagé par tous les backends."""
+    return AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    """Charge (une seule fois par backend) le modèle d'embedding."""
+    check_backend(backend)
+    # lru_cache keys on the arguments as passed : load_embedding_model() and
+    # load_embedding_model("torch") would be two entries, hence two models
+    return _load_embedding_model(backend)
+
+
+@lru_cache(maxsize=None)
+def _load_embedding_model(backend: str) -> SentenceTransformer:
+    logger.info(f"🤖 Loading multilingual embedding model ({backend})...")
+    if backend == "onnx":
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx", device="cpu")
+    elif backend == "int8":
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+        torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    else:
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    model.tokenizer = get_tokenizer()
+    return model
+
+
+# This class allow to do the embedding under the hood and directy pass the documents to chromadb
+# chromadb embeds the added documents with __call__ and the query texts with embed_query
+class SentenceTransformerEmbeddingFunction(EmbeddingFunction):
+    def __init__(
+        self,
+        backend: str = EMBEDDING_BACKEND,
+        use_prefixes: bool = True,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ) -> None:
+        super().__init__()
+        check_backend(backend)
+        self.backend = backend
+        self.use_prefixes = use_prefixes
+        self.batch_size = batch_size
+
+    def _encode(self, input: Documents, prefix: str) -> Embeddings:
+        model = load_embedding_model(self.backend)
+        if self.use_prefixes:
+            input = [prefix + text for text in input]
+        return model.encode(input, batch_size=self.batch_size).tolist()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._encode(input, PASSAGE_PREFIX)
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        return self._encode(input, QUERY_PREFIX)
+
+
+def length_sorted_batches(
+    documents: list[str], batch_size: int = EMBEDDING_BATCH_SIZE
+) -> list[list[int]]:
+    """
+    Découpe les documents en lots de longueurs proches pour limiter le padding.
+    SentenceTransformer.encode ne trie que dans un même appel : le tri global
+    garde des lots aussi serrés qu'un seul appel quand ils sont envoyés un par un.
+
+    Returns:
+        list[list[int]]: Les index des documents de chaque lot.
+    """
+    order = sorted(range(len(documents)), key=lambda i: len(documents[i]))
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def topk_indices(queries: np.ndarray, documents: np.ndarray, k: int = 1) -> np.ndarray:
+    """Index des k documents les plus proches (cosinus) pour chaque requête."""
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    documents = documents / np.linalg.norm(documents, axis=1, keepdims=True)
+    return np.argsort(-(queries @ documents.T), axis=1)[:, :k]
+
+
+def backend_agreement(
+    documents: list[str],
+    backend: str,
+    queries: list[str] = SAMPLE_QUERIES,
+    baseline: str = "torch",
+) -> float:
+    """
+    Compare le top-1 de la recherche entre un backend et le baseline.
+
+    Returns:
+        float: La proportion de requêtes pour lesquelles les deux backends
+        retrouvent le même document.
+    """
+    top1 = {}
+    for name in (baseline, backend):
+        embedding_function = SentenceTransformerEmbeddingFunction(backend=name)
+        documents_embeddings = np.array(embedding_function(documents))
+
+        # Warm up before timing
+        embedding_function.embed_query(queries[:1])
+        start = time.perf_counter()
+        queries_embeddings = np.array(
+            [embedding_function.embed_query([query])[0] for query in queries]
+        )
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        logger.info(f"⏱️ {name} : {latency_ms:.1f} ms per query")
+
+        top1[name] = topk_indices(queries_embeddings, documents_embeddings)[:, 0]
+
+    return float(np.mean(top1[baseline] == top1[backend]))
+
+
+def evaluate_retrieval(
+    documents: list[str],
+    queries: list[str],
+    embedding_function: SentenceTransformerEmbeddingFunction,
+    k: int = 5,
+    batched: bool = True,
+) -> dict[str, float]:
+    """
+    Mesure la qualité de la recherche et le débit d'indexation.
+    La requête queries[i] doit retrouver le document documents[i].
+
+    Args:
+        batched: Embedde les documents par length_sorted_batches, sinon en un seul
+            appel comme l'ancienne indexation.
+
+    Returns:
+        dict[str, float]: hit@1, hit@k et le nombre de documents embeddés par seconde.
+    """
+    # Load the model before timing, otherwise the first configuration pays for it
+    embedding_function(documents[:1])
+    start = time.perf_counter()
+    if batched:
+        embeddings: Embeddings = [None] * len(documents)  # type: ignore[list-item]
+        for batch in length_sorted_batches(documents, embedding_function.batch_size):
+            batch_embeddings = embedding_function([documents[i] for i in batch])
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+    else:
+        embeddings = embedding_function(documents)
+    documents_per_s = len(documents) / (time.perf_counter() - start)
+
+    documents_embeddings = np.array(embeddings)
+    queries_embeddings = np.array(embedding_function.embed_query(queries))
+    topk = topk_indices(queries_embeddings, documents_embeddings, k)
+    expected = np.arange(len(queries))[:, None]
+
+    return {
+        "hit@1": float(np.mean(topk[:, 0] == expected[:, 0])),
+        f"hit@{k}": float(np.mean(np.any(topk == expected, axis=1))),
+        "documents/s": documents_per_s,
+    }
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from muffin.constant import LLM_MODEL, LOGGING_LEVEL
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=LOGGING_LEVEL)
+
+
+LOAD_TEST_PROMPTS = [
+    "chocolat, banane",
+    "myrtilles et citron",
+    "pomme cannelle",
+    "framboise chocolat blanc",
+    "noix de coco",
+    "pépites de chocolat",
+]
+FAKE_ANSWER = "Yo c'est MC Muffin, " * 50
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Répond à /api/chat comme Ollama, sans modèle derrière."""
+
+    token_delay = 0.01
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        tokens = FAKE_ANSWER.split(" ")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        if not body.get("stream", True):
+            time.sleep(self.token_delay * len(tokens))
+            self.wfile.write(json.dumps(self._chunk(FAKE_ANSWER, True)).encode())
+            return
+
+        for token in tokens:
+            time.sleep(self.token_delay)
+            chunk = self._chunk(token + " ", False)
+            self.wfile.write(json.dumps(chunk).encode() + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps(self._chunk("", True)).encode() + b"\n")
+
+    def _chunk(self, content: str, done: bool) -> dict:
+        return {
+            "model": LLM_MODEL,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def start_fake_ollama(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 120) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError("The API did not start in time")
+
+
+async def one_request(client: httpx.AsyncClient) -> tuple[str, float, float]:
+    """Rend l'endpoint appelé, la latence totale et le temps avant le premier octet."""
+    prompt = random.choice(LOAD_TEST_PROMPTS)
+    endpoint = random.choices(["search", "generate"], weights=[3, 1])[0]
+    start = time.perf_counter()
+
+    if endpoint == "search":
+        response = await client.get("/search", params={"q": prompt})
+        response.raise_for_status()
+        latency = time.perf_counter() - start
+        return endpoint, latency, latency
+
+    first_byte = None
+    async with client.stream("POST", "/generate", json={"prompt": prompt}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    return endpoint, time.perf_counter() - start, first_byte or 0.0
+
+
+async def drive(base_url: str, requests: int, concurrency: int) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await wait_until_ready(client)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited() -> tuple[str, float, float]:
+            async with semaphore:
+                return await one_request(client)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(limited() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    print(f"🚀 {requests} requests in {elapsed:.1f}s ({requests / elapsed:.1f} req/s)")
+    for endpoint in ("search", "generate"):
+        latencies = [latency for name, latency, _ in results if name == endpoint]
+        first_bytes = [first for name, _, first in results if name == endpoint]
+        if len(latencies) < 2:
+            continue
+        p50, p95 = [statistics.quantiles(latencies, n=100)[i] for i in (49, 94)]
+        print(
+            f"{endpoint} : {len(latencies)} requests, p50={p50 * 1000:.0f}ms, "
+            f"p95={p95 * 1000:.0f}ms, "
+            f"first byte p50={statistics.median(first_bytes) * 1000:.0f}ms"
+        )
+
+
+def run_load_test() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test the HTTP API against a fake Ollama backend."
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    args = parser.parse_args()
+
+    fake_ollama = start_fake_ollama(args.ollama_port)
+    env = {
+        **os.environ,
+        "OLLAMA_HOST": f"http://127.0.0.1:{args.ollama_port}",
+        # Keep the load test out of the real query log
+        "MUFFIN_QUERY_LOG_PATH": os.path.join(tempfile.mkdtemp(), "query_log.db"),
+    }
+    api = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "muffin.api:app",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+    try:
+        asyncio.run(
+            drive(f"http://127.0.0.1:{args.port}", args.requests, args.concurrency)
+        )
+    finally:
+        api.terminate()
+        api.wait()
+        fake_ollama.shutdown()
@@ -1,40 +1,58 @@
 import logging
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from functools import lru_cache
 
 import chromadb
 import ollama
-
-from muffin.constant import CHROMADB_PATH, COLLECTION_NAME, LOGGING_LEVEL
+from chromadb.api.models.Collection import Collection
+from chromadb.errors import NotFoundError
+
+from muffin.constant import (
+    CHAT_MAX_TURNS,
+    CHROMADB_PATH,
+    COLLECTION_NAME,
+    LLM_MODEL,
+    LOGGING_LEVEL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_NUM_CTX,
+)
+from muffin.embedding import PREFIXED_METADATA_KEY
 from muffin.models import (
     RecipeModel,
     SentenceTransformerEmbeddingFunction,
     SessionLocal,
     convert_model_to_dataclass,
+    get_pregenerated_answer,
 )
+from muffin.query_log import QueryLogEntry, log_query
+from muffin.recipe import Recipe
+from muffin.utils import classify_prompt, normalize_prompt, trim_history
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=LOGGING_LEVEL)
 
-logger.info("⏳ Chargement de l'espace latent depuis ChromaDB...")
-client = chromadb.PersistentClient(path=CHROMADB_PATH)
-collection = client.get_collection(
-    name=COLLECTION_NAME,
-    embedding_function=SentenceTransformerEmbeddingFunction(),
-)
 
+@lru_cache(maxsize=1)
+def get_collection() -> Collection:
+    """Ouvre ChromaDB au premier appel, puis garde la collection pour le processus."""
+    logger.info("⏳ Chargement de l'espace latent depuis ChromaDB...")
+    client = chromadb.PersistentClient(path=CHROMADB_PATH)
+    embedding_function = SentenceTransformerEmbeddingFunction()
+    collection = client.get_collection(
+        name=COLLECTION_NAME,
+        embedding_function=embedding_function,
+    )
+    # Queries only get the e5 prefix if the documents were indexed with it
+    embedding_function.use_prefixes = bool(
+        (collection.metadata or {}).get(PREFIXED_METADATA_KEY, False)
+    )
+    return collection
 
-def final_prompt(user_prompt: str, str_recipe: str) -> str:
-    """
-    Génère une réponse structurée et détaillée en utilisant le modèle Mistral.
 
-    Args:
-        user_prompt: La question ou les ingrédients de l'utilisateur.
-        str_recipe: La chaîne de caractères contenant les données de la recette (contexte).
-
-    Returns:
-        str: La réponse formatée du Chef Muffin.
-    """
-    # Le message système définit le comportement de l'IA avec des contraintes de structure
-    system_prompt: str = """
+# Le message système définit le comportement de l'IA avec des contraintes de structure
+SYSTEM_PROMPT = """
     TU ES "MC MUFFIN". UN ASSISTANT CULINAIRE QUI PRÉSENTE DES RECETTES DE MUFFINS EN RAPPANT.
 
     ### TES DIRECTIVES (GUARDRAILS) :
@@ -50,39 +68,184 @@ def final_prompt(user_prompt: str, str_recipe: str) -> str:
     Salue ton audience en partant, par exemple : "PEACE, c'était MC MUFFIN le king !"
     """
 
-    # ### INTERDICTION :
-    # - Pas de résumé bâclé : on veut le morceau complet, pas un teaser.
-    # - N'invente pas d'étapes : reste fidèle au texte source (le sample d'origine).
-    # """
+# ### INTERDICTION :
+# - Pas de résumé bâclé : on veut le morceau complet, pas un teaser.
+# - N'invente pas d'étapes : reste fidèle au texte source (le sample d'origine).
+# """
 
-    augmented_prompt: str = f"""
+
+def build_messages(user_prompt: str, str_recipe: str) -> list[dict[str, str]]:
+    """
+    Construit le début de la conversation avec Mistral.
+
+    La recette est dans le message système : quand la conversation dépasse le
+    contexte, Ollama retire les plus anciens messages mais garde toujours celui-ci.
+
+    Args:
+        user_prompt: La question ou les ingrédients de l'utilisateur.
+        str_recipe: La chaîne de caractères contenant les données de la recette (contexte).
+
+    Returns:
+        list[dict[str, str]]: Les messages système et utilisateur.
+    """
+    system_prompt: str = f"""{SYSTEM_PROMPT}
     CONTEXTE (Données brutes de la recette) :
     {str_recipe}
+    """
 
+    augmented_prompt: str = f"""
     QUESTION DE L'UTILISATEUR :
     {user_prompt}
     
     INSTRUCTION : Produis la recette complète en respectant la structure imposée.
     """
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": augmented_prompt},
+    ]
+
+
+def chat(messages: list[dict[str, str]]) -> str:
+    # keep_alive keeps the model loaded between two turns of the conversation
     response = ollama.chat(
-        model="mistral",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": augmented_prompt},
-        ],
+        model=LLM_MODEL,
+        messages=messages,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        options={"num_ctx": OLLAMA_NUM_CTX},
     )
 
     return str(response["message"]["content"])
 
 
-def main(user_prompt: str) -> str:
-    results = collection.query(query_texts=[user_prompt], n_results=1)
+def chat_stream(messages: list[dict[str, str]]) -> Iterator[str]:
+    """Même appel que chat, mais rend la réponse morceau par morceau."""
+    for chunk in ollama.chat(
+        model=LLM_MODEL,
+        messages=messages,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        options={"num_ctx": OLLAMA_NUM_CTX},
+        stream=True,
+    ):
+        yield str(chunk["message"]["content"])
+
+
+def final_prompt(user_prompt: str, str_recipe: str) -> str:
+    """
+    Génère une réponse structurée et détaillée en utilisant le modèle Mistral.
+
+    Args:
+        user_prompt: La question ou les ingrédients de l'utilisateur.
+        str_recipe: La chaîne de caractères contenant les données de la recette (contexte).
+
+    Returns:
+        str: La réponse formatée du Chef Muffin.
+    """
+    return chat(build_messages(user_prompt, str_recipe))
+
+
+def follow_up(messages: list[dict[str, str]], user_prompt: str) -> str:
+    """
+    Répond à une question de suivi sans refaire la recherche.
+
+    Le début de l'historique est renvoyé tel quel : Ollama retrouve le même préfixe
+    (prompt système + recette) dans son cache KV et ne traite que les nouveaux tours.
+    Seuls les CHAT_MAX_TURNS derniers échanges suivent le premier, pour tenir dans
+    OLLAMA_NUM_CTX.
+
+    Args:
+        messages: La conversation en cours, complétée sur place si l'appel réussit.
+        user_prompt: La nouvelle question de l'utilisateur.
+
+    Returns:
+        str: La réponse du Chef Muffin.
+    """
+    user_message = {"role": "user", "content": user_prompt}
+    answer = chat(trim_history(messages, CHAT_MAX_TURNS) + [user_message])
+    messages += [user_message, {"role": "assistant", "content": answer}]
+    return answer
+
+
+@dataclass
+class Retrieval:
+    recipe: Recipe
+    recipe_ids: list[int]
+    distances: list[float]
+    latency_ms: float
+
+
+def retrieve_recipe(user_prompt: str, n_results: int = 1) -> Retrieval:
+    """
+    Étape de recherche : la recette la plus proche du prompt de l'utilisateur.
+    Les ids et distances des n_results plus proches sont aussi rendus.
+    """
+    start = time.perf_counter()
+    try:
+        results = get_collection().query(query_texts=[user_prompt], n_results=n_results)
+    except NotFoundError:
+        # The index was rebuilt (index_documents) since the collection was opened
+        get_collection.cache_clear()
+        results = get_collection().query(query_texts=[user_prompt], n_results=n_results)
+    recipe_ids = [int(recipe_id) for recipe_id in results["ids"][0]]
     with SessionLocal() as session:
         logger.info("⏳ Chargement de la recette depuis SQLite...")
-        recipe_model = (
-            session.query(RecipeModel).filter_by(id=int(results["ids"][0][0])).one()
-        )
+        recipe_model = session.query(RecipeModel).filter_by(id=recipe_ids[0]).one()
         recipe = convert_model_to_dataclass(recipe_model)
         logger.info(f"Found recipe : {recipe.title} with id {recipe.id}")
-    return final_prompt(user_prompt, str(recipe))
+    return Retrieval(
+        recipe=recipe,
+        recipe_ids=recipe_ids,
+        distances=list(results["distances"][0]) if results["distances"] else [],
+        latency_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+def generate_answer(
+    user_prompt: str, recipe: Recipe, log_entry: QueryLogEntry | None = None
+) -> str:
+    """Étape de génération : réponse pré-générée si elle existe, sinon Mistral."""
+    start = time.perf_counter()
+    answer = get_pregenerated_answer(recipe.id, classify_prompt(user_prompt))
+    pregenerated_hit = answer is not None
+    if answer is not None:
+        logger.info(f"⚡ Pre-generated answer for recipe {recipe.id}")
+    else:
+        answer = final_prompt(user_prompt, str(recipe))
+
+    if log_entry is not None:
+        log_entry.pregenerated_hit = pregenerated_hit
+        log_entry.generation_ms = (time.perf_counter() - start) * 1000
+    return answer
+
+
+def generate_answer_stream(
+    user_prompt: str, recipe: Recipe, log_entry: QueryLogEntry | None = None
+) -> Iterator[str]:
+    """Comme generate_answer, en streaming."""
+    start = time.perf_counter()
+    answer = get_pregenerated_answer(recipe.id, classify_prompt(user_prompt))
+    pregenerated_hit = answer is not None
+    if answer is not None:
+        logger.info(f"⚡ Pre-generated answer for recipe {recipe.id}")
+        yield answer
+    else:
+        yield from chat_stream(build_messages(user_prompt, str(recipe)))
+
+    if log_entry is not None:
+        log_entry.pregenerated_hit = pregenerated_hit
+        log_entry.generation_ms = (time.perf_counter() - start) * 1000
+
+
+def main(user_prompt: str) -> str:
+    start = time.perf_counter()
+    retrieval = retrieve_recipe(user_prompt)
+    log_entry = QueryLogEntry(
+        prompt=normalize_prompt(user_prompt),
+        recipe_ids=retrieval.recipe_ids,
+        distances=retrieval.distances,
+        retrieval_ms=retrieval.latency_ms,
+    )
+    answer = generate_answer(user_prompt, retrieval.recipe, log_entry)
+    log_entry.total_ms = (time.perf_counter() - start) * 1000
+    log_query(log_entry)
+    return answer
@@ -1,11 +1,23 @@
 import logging
 import os
-from typing import Any, List, Optional
+import time
+from datetime import datetime
+from typing import List, Optional
 
 import chromadb
-from chromadb import Documents, EmbeddingFunction, Embeddings
-from sentence_transformers import SentenceTransformer
-from sqlalchemy import Float, ForeignKey, Integer, String, create_engine
+from chromadb.api import ClientAPI
+from chromadb.errors import NotFoundError
+from sqlalchemy import (
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+    create_engine,
+    func,
+)
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -18,8 +30,17 @@ from muffin.constant import (
     CHROMADB_PATH,
     COLLECTION_NAME,
     LOGGING_LEVEL,
+    PREGENERATION_VERSION,
     RAW_RECIPE_FOLDER,
 )
+from muffin.embedding import (
+    EMBEDDING_BACKENDS,
+    PREFIXED_METADATA_KEY,
+    SentenceTransformerEmbeddingFunction,
+    backend_agreement,
+    evaluate_retrieval,
+    length_sorted_batches,
+)
 from muffin.recipe import Ingredient, Recipe, Servings, ServingUnit, raw_json_to_recipe
 
 engine = create_engine("sqlite:///data/recipes.db", echo=False)
@@ -28,8 +49,8 @@ SessionLocal = sessionmaker(bind=engine)
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=LOGGING_LEVEL)
 
-
-EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-small"
+# index_documents builds the new index under this name before swapping it in
+BUILDING_COLLECTION_NAME = f"{COLLECTION_NAME}_building"
 
 
 class Base(DeclarativeBase):
@@ -92,6 +113,18 @@ class InstructionModel(Base):
     recipe: Mapped["RecipeModel"] = relationship(back_populates="instructions")
 
 
+class PregeneratedAnswerModel(Base):
+    __tablename__ = "pregenerated_answers"
+    __table_args__ = (UniqueConstraint("recipe_id", "prompt_class", "version"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    recipe_id: Mapped[int] = mapped_column(ForeignKey("recipes.id"))
+    prompt_class: Mapped[str] = mapped_column(String(50))
+    version: Mapped[int] = mapped_column(Integer)
+    content: Mapped[str] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
 def setup_database() -> None:
     logger.info("Creating SQLite db...")
     Base.metadata.create_all(engine)
@@ -165,6 +198,50 @@ def get_recipe_by_id(recipe_id: int) -> Recipe:
         return convert_model_to_dataclass(db_recipe)
 
 
+def get_pregenerated_answer(
+    recipe_id: int, prompt_class: str, version: int = PREGENERATION_VERSION
+) -> str | None:
+    with SessionLocal() as session:
+        try:
+            answer = (
+                session.query(PregeneratedAnswerModel)
+                .filter_by(
+                    recipe_id=recipe_id, prompt_class=prompt_class, version=version
+                )
+                .one_or_none()
+            )
+        except OperationalError:
+            # No table until setup_database or pregenerate_answers has run
+            return None
+        return answer.content if answer else None
+
+
+def save_pregenerated_answer(
+    recipe_id: int,
+    prompt_class: str,
+    content: str,
+    version: int = PREGENERATION_VERSION,
+) -> None:
+    with SessionLocal() as session:
+        answer = (
+            session.query(PregeneratedAnswerModel)
+            .filter_by(recipe_id=recipe_id, prompt_class=prompt_class, version=version)
+            .one_or_none()
+        )
+        if answer:
+            answer.content = content
+        else:
+            session.add(
+                PregeneratedAnswerModel(
+                    recipe_id=recipe_id,
+                    prompt_class=prompt_class,
+                    version=version,
+                    content=content,
+                )
+            )
+        session.commit()
+
+
 def raw_db_to_clean_db(folder: str = RAW_RECIPE_FOLDER) -> None:
     for file in os.listdir(folder):
         if not file.endswith(".json"):
@@ -174,15 +251,12 @@ def raw_db_to_clean_db(folder: str = RAW_RECIPE_FOLDER) -> None:
         logger.info(f"Saved {recipe.title} to db")
 
 
-# This class allow to do the embedding under the hood and directy pass the documents to chromadb
-class SentenceTransformerEmbeddingFunction(EmbeddingFunction):
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-
-    def __call__(self, input: Documents) -> Embeddings:
-        logger.info("🤖 Loading multilingual embedding model...")
-        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-        return model.encode(input).tolist()
+def recipes_to_documents(recipes: List[RecipeModel]) -> List[str]:
+    """Le document embeddé pour une recette est la liste de ses ingrédients."""
+    return [
+        ", ".join([ingredient.name for ingredient in recipe.ingredients])
+        for recipe in recipes
+    ]
 
 
 def create_embedding_db() -> None:
@@ -191,19 +265,93 @@ def create_embedding_db() -> None:
         recipes = session.query(RecipeModel).all()
 
         ids = [str(recipe.id) for recipe in recipes]
+        ingredientss = recipes_to_documents(recipes)
+
+    index_documents(ids, ingredientss)
 
-        ingredientss = [recipe.ingredients for recipe in recipes]
-        ingredientss = [
-            ", ".join([ingredient.name for ingredient in ingredients])
-            for ingredients in ingredientss
-        ]
 
-        client = chromadb.PersistentClient(path=CHROMADB_PATH)
+def delete_collection_if_exists(client: ClientAPI, name: str) -> None:
+    try:
+        client.delete_collection(name)
+    except NotFoundError:
+        pass
 
-        collection = client.get_or_create_collection(
-            name=COLLECTION_NAME,
-            embedding_function=SentenceTransformerEmbeddingFunction(),
+
+def index_documents(ids: List[str], ingredientss: List[str]) -> None:
+    """
+    Reconstruit entièrement l'index : aucun ancien embedding ne reste.
+    Le nouvel index est construit à côté puis renommé, l'ancien reste en place
+    si l'encodage échoue.
+    """
+    client = chromadb.PersistentClient(path=CHROMADB_PATH)
+    # Left over by an indexation that failed
+    delete_collection_if_exists(client, BUILDING_COLLECTION_NAME)
+
+    embedding_function = SentenceTransformerEmbeddingFunction()
+    collection = client.create_collection(
+        name=BUILDING_COLLECTION_NAME,
+        embedding_function=embedding_function,
+        metadata={PREFIXED_METADATA_KEY: embedding_function.use_prefixes},
+    )
+
+    # Load the model before timing, the throughput is the embedding one
+    embedding_function(ingredientss[:1])
+    start = time.perf_counter()
+    for batch in length_sorted_batches(ingredientss, embedding_function.batch_size):
+        collection.add(
+            documents=[ingredientss[i] for i in batch],
+            ids=[ids[i] for i in batch],
         )
-        collection.add(documents=ingredientss, ids=ids)
+    documents_per_s = len(ids) / (time.perf_counter() - start)
+
+    delete_collection_if_exists(client, COLLECTION_NAME)
+    collection.modify(name=COLLECTION_NAME)
+
+    logger.info(
+        f"✅ Indexation over ! {collection.count()} recipes embedded "
+        f"({documents_per_s:.1f} documents/s)."
+    )
+
+
+def evaluate_embeddings() -> None:
+    """
+    Compare la recherche et le débit d'indexation avant (sans préfixes e5, un seul
+    appel d'encodage) et après (préfixes, lots triés par longueur) : chaque titre
+    de recette doit retrouver la liste d'ingrédients de la même recette.
+    """
+    with SessionLocal() as session:
+        logger.info("⏳ Loading recipes from SQLite...")
+        recipes = session.query(RecipeModel).all()
+        documents = recipes_to_documents(recipes)
+        titles = [recipe.title for recipe in recipes]
+
+    for use_prefixes in (False, True):
+        for batched in (False, True):
+            metrics = evaluate_retrieval(
+                documents,
+                titles,
+                SentenceTransformerEmbeddingFunction(use_prefixes=use_prefixes),
+                batched=batched,
+            )
+            logger.info(
+                f"📊 prefixes={use_prefixes} batched={batched} : "
+                + ", ".join(f"{name}={value:.3f}" for name, value in metrics.items())
+            )
+
 
-        logger.info(f"✅ Indexation over ! {collection.count()} recipes embedded.")
+def check_embedding_backends() -> None:
+    """Vérifie que les backends optimisés retrouvent les mêmes recettes que PyTorch."""
+    with SessionLocal() as session:
+        logger.info("⏳ Loading recipes from SQLite...")
+        documents = recipes_to_documents(session.query(RecipeModel).all())
+
+    for backend in EMBEDDING_BACKENDS:
+        if backend == "torch":
+            continue
+        try:
+            agreement = backend_agreement(documents, backend)
+        except Exception as e:
+            # e.g. the onnx extra is not installed, the other backends are still checked
+            logger.warning(f"❌ {backend} could not be checked : {e}")
+            continue
+        logger.info(f"✅ {backend} : {agreement:.0%} top-1 agreement with torch")
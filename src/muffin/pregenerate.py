@@ -0,0 +1,94 @@
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from muffin.constant import LOGGING_LEVEL, PREGENERATION_VERSION
+from muffin.main import final_prompt
+from muffin.models import (
+    Base,
+    engine,
+    get_pregenerated_answer,
+    get_recipe_by_id,
+    save_pregenerated_answer,
+)
+from muffin.query_log import load_query_log, top_recipe_ids
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=LOGGING_LEVEL)
+
+
+# Only plain ingredient lists share the same answer, custom prompts always go to Mistral
+PREGENERATED_PROMPT_CLASS = "ingredients"
+PREGENERATION_PROMPT = "Donne-moi la recette complète de ce muffin."
+
+
+def generate_recipe_answer(recipe_id: int) -> str:
+    recipe = get_recipe_by_id(recipe_id)
+    return final_prompt(PREGENERATION_PROMPT, str(recipe))
+
+
+def pregenerate_answers(
+    recipe_ids: list[int], workers: int = 2, force: bool = False
+) -> None:
+    """
+    Génère en tâche de fond les réponses pour les recettes demandées.
+
+    Args:
+        recipe_ids: Les recettes à pré-générer.
+        workers: Le nombre d'appels simultanés à Ollama (cf. OLLAMA_NUM_PARALLEL).
+        force: Régénère aussi les réponses déjà présentes pour cette version.
+    """
+    Base.metadata.create_all(engine)
+
+    if not force:
+        recipe_ids = [
+            recipe_id
+            for recipe_id in recipe_ids
+            if get_pregenerated_answer(recipe_id, PREGENERATED_PROMPT_CLASS) is None
+        ]
+    logger.info(
+        f"⏳ Pre-generating {len(recipe_ids)} answers (version {PREGENERATION_VERSION})..."
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(generate_recipe_answer, recipe_id): recipe_id
+            for recipe_id in recipe_ids
+        }
+        # SQLite writes stay in this thread, the workers only wait for Ollama
+        for future in as_completed(futures):
+            recipe_id = futures[future]
+            try:
+                content = future.result()
+            except Exception as e:
+                logger.warning(f"❌ Recipe {recipe_id} failed : {e}")
+                continue
+            save_pregenerated_answer(recipe_id, PREGENERATED_PROMPT_CLASS, content)
+            logger.info(f"Saved answer for recipe {recipe_id}")
+
+    logger.info("✅ Pre-generation over !")
+
+
+def run_pregeneration() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pre-generate MC Muffin answers for the most popular recipes."
+    )
+    parser.add_argument("recipe_ids", nargs="*", type=int)
+    parser.add_argument(
+        "--top", type=int, help="Add the N recipes most retrieved in the query log"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    recipe_ids = list(args.recipe_ids)
+    if args.top:
+        recipe_ids += [
+            recipe_id
+            for recipe_id in top_recipe_ids(load_query_log(), args.top)
+            if recipe_id not in recipe_ids
+        ]
+    if not recipe_ids:
+        parser.error("give recipe ids or --top N")
+
+    pregenerate_answers(recipe_ids, workers=args.workers, force=args.force)
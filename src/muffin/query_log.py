@@ -0,0 +1,203 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import Boolean, DateTime, Float, String, create_engine, insert
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from muffin.constant import LOGGING_LEVEL, QUERY_LOG_PATH
+from muffin.utils import classify_prompt
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=LOGGING_LEVEL)
+
+
+QUERY_LOG_URL = f"sqlite:///{QUERY_LOG_PATH}"
+
+
+class QueryLogBase(DeclarativeBase):
+    pass
+
+
+class QueryLogModel(QueryLogBase):
+    __tablename__ = "query_log"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    kind: Mapped[str] = mapped_column(String(20))  # "search" or "follow_up"
+    prompt: Mapped[str] = mapped_column(String)
+    prompt_class: Mapped[str] = mapped_column(String(50))
+    recipe_ids: Mapped[str] = mapped_column(String)  # JSON list
+    distances: Mapped[str] = mapped_column(String)  # JSON list
+    retrieval_ms: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    generation_ms: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    total_ms: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    prefetch_hit: Mapped[bool] = mapped_column(Boolean)
+    pregenerated_hit: Mapped[bool] = mapped_column(Boolean)
+
+
+@dataclass
+class QueryLogEntry:
+    prompt: str  # normalized
+    # "follow_up" for chat turns, which reuse the recipe retrieved by the search
+    kind: str = "search"
+    recipe_ids: list[int] = field(default_factory=list)
+    distances: list[float] = field(default_factory=list)
+    retrieval_ms: float | None = None
+    generation_ms: float | None = None
+    total_ms: float | None = None
+    prefetch_hit: bool = False
+    pregenerated_hit: bool = False
+    created_at: datetime = field(default_factory=datetime.now)
+
+    def to_row(self) -> dict:
+        return {
+            "created_at": self.created_at,
+            "kind": self.kind,
+            "prompt": self.prompt,
+            "prompt_class": classify_prompt(self.prompt),
+            "recipe_ids": json.dumps(self.recipe_ids),
+            "distances": json.dumps(self.distances),
+            "retrieval_ms": self.retrieval_ms,
+            "generation_ms": self.generation_ms,
+            "total_ms": self.total_ms,
+            "prefetch_hit": self.prefetch_hit,
+            "pregenerated_hit": self.pregenerated_hit,
+        }
+
+
+class QueryLogger:
+    """
+    Écrit le journal des requêtes depuis un thread dédié, par lots,
+    pour que le chemin de service ne fasse qu'un put dans une queue.
+    """
+
+    def __init__(
+        self,
+        url: str = QUERY_LOG_URL,
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self.engine = create_engine(url, echo=False)
+        QueryLogBase.metadata.create_all(self.engine)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue[QueryLogEntry | None] = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self.thread.start()
+
+    def log(self, entry: QueryLogEntry) -> None:
+        self.queue.put(entry)
+
+    def close(self) -> None:
+        """Écrit les entrées restantes puis arrête le thread."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self) -> None:
+        batch: list[QueryLogEntry] = []
+        while True:
+            try:
+                entry = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush(batch)
+                continue
+
+            if entry is None:
+                self._flush(batch)
+                return
+
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+
+    def _flush(self, batch: list[QueryLogEntry]) -> None:
+        if not batch:
+            return
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(
+                    insert(QueryLogModel), [entry.to_row() for entry in batch]
+                )
+        except Exception as e:
+            # Losing a few log entries must never break the app
+            logger.warning(f"Could not write {len(batch)} query log entries : {e}")
+        batch.clear()
+
+
+_query_logger: QueryLogger | None = None
+_query_logger_lock = threading.Lock()
+
+
+def log_query(entry: QueryLogEntry) -> None:
+    """Ajoute une entrée au journal, sans attendre l'écriture."""
+    global _query_logger
+    with _query_logger_lock:
+        if _query_logger is None:
+            _query_logger = QueryLogger()
+            atexit.register(_query_logger.close)
+    _query_logger.log(entry)
+
+
+def load_query_log(url: str = QUERY_LOG_URL) -> pd.DataFrame:
+    engine = create_engine(url, echo=False)
+    QueryLogBase.metadata.create_all(engine)
+    query_log = pd.read_sql_table(QueryLogModel.__tablename__, engine)
+    query_log["recipe_ids"] = query_log["recipe_ids"].map(json.loads)
+    query_log["distances"] = query_log["distances"].map(json.loads)
+    return query_log
+
+
+def searches(query_log: pd.DataFrame) -> pd.DataFrame:
+    """Sans les tours de chat, qui ne refont pas de recherche."""
+    return query_log[query_log["kind"] == "search"]
+
+
+def top_queries(query_log: pd.DataFrame, n: int = 10) -> pd.Series:
+    return searches(query_log)["prompt"].value_counts().head(n)
+
+
+def top_recipe_ids(query_log: pd.DataFrame, n: int = 10) -> list[int]:
+    """Les recettes retrouvées le plus souvent (top-1 de chaque recherche)."""
+    recipe_ids = searches(query_log)["recipe_ids"].map(
+        lambda ids: ids[0] if ids else None
+    )
+    return [int(recipe_id) for recipe_id in recipe_ids.value_counts().head(n).index]
+
+
+def hit_ratios(query_log: pd.DataFrame) -> pd.Series:
+    return (
+        searches(query_log)[["prefetch_hit", "pregenerated_hit"]].astype(float).mean()
+    )
+
+
+def latency_percentiles(
+    query_log: pd.DataFrame, percentiles: tuple[float, ...] = (0.5, 0.95, 0.99)
+) -> pd.DataFrame:
+    """Percentiles par type d'entrée, les latences absentes (None) sont ignorées."""
+    return query_log.groupby("kind")[
+        ["retrieval_ms", "generation_ms", "total_ms"]
+    ].quantile(list(percentiles))
+
+
+def print_query_report() -> None:
+    query_log = load_query_log()
+    if query_log.empty:
+        logger.info("The query log is empty.")
+        return
+
+    print(f"📒 {len(query_log)} queries logged\n")
+    print("Top queries :")
+    print(top_queries(query_log).to_string(), "\n")
+    print("Top recipes :")
+    print(top_recipe_ids(query_log), "\n")
+    print("Hit ratios :")
+    print(hit_ratios(query_log).to_string(), "\n")
+    print("Latency percentiles (ms) :")
+    print(latency_percentiles(query_log).to_string())
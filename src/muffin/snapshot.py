@@ -0,0 +1,114 @@
+import argparse
+import logging
+import os
+import time
+
+import pandas as pd
+from sqlalchemy import Engine, delete
+
+from muffin.constant import LOGGING_LEVEL, SNAPSHOT_FOLDER
+from muffin.models import (
+    Base,
+    IngredientModel,
+    InstructionModel,
+    PregeneratedAnswerModel,
+    RecipeModel,
+    ServingsModel,
+    engine,
+    index_documents,
+)
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=LOGGING_LEVEL)
+
+
+# Parents first so that the foreign keys always point to an existing recipe
+SNAPSHOT_MODELS = [RecipeModel, ServingsModel, IngredientModel, InstructionModel]
+
+# Few distinct values repeated on many rows, stored as Parquet dictionaries
+DICTIONARY_COLUMNS = {
+    ServingsModel.__tablename__: ["unit"],
+    IngredientModel.__tablename__: ["name", "unit"],
+}
+
+
+def export_corpus(folder: str = SNAPSHOT_FOLDER, engine: Engine = engine) -> None:
+    """Écrit chaque table du corpus dans un fichier Parquet."""
+    os.makedirs(folder, exist_ok=True)
+    for model in SNAPSHOT_MODELS:
+        table = model.__tablename__
+        df = pd.read_sql_table(table, engine)
+        for column in DICTIONARY_COLUMNS.get(table, []):
+            df[column] = df[column].astype("category")
+        df.to_parquet(os.path.join(folder, f"{table}.parquet"), index=False)
+        logger.info(f"Exported {len(df)} rows from {table}")
+
+
+def load_corpus(folder: str = SNAPSHOT_FOLDER) -> dict[str, pd.DataFrame]:
+    return {
+        model.__tablename__: pd.read_parquet(
+            os.path.join(folder, f"{model.__tablename__}.parquet")
+        )
+        for model in SNAPSHOT_MODELS
+    }
+
+
+def import_corpus(folder: str = SNAPSHOT_FOLDER, engine: Engine = engine) -> None:
+    """
+    Remplace le contenu des tables du corpus par celui du snapshot.
+    Les réponses pré-générées sont supprimées : leurs recettes ont pu changer.
+    """
+    corpus = load_corpus(folder)
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(delete(PregeneratedAnswerModel.__table__))
+        for model in reversed(SNAPSHOT_MODELS):
+            connection.execute(delete(model.__table__))
+        for model in SNAPSHOT_MODELS:
+            table = model.__tablename__
+            corpus[table].to_sql(table, connection, if_exists="append", index=False)
+            logger.info(f"Imported {len(corpus[table])} rows into {table}")
+
+
+def ingredient_documents(recipes: pd.DataFrame, ingredients: pd.DataFrame) -> pd.Series:
+    """Même document que models.recipes_to_documents, indexé par id de recette."""
+    return (
+        ingredients.sort_values("id")
+        .astype({"name": str})
+        .groupby("recipe_id")["name"]
+        .agg(", ".join)
+        .reindex(recipes["id"], fill_value="")
+    )
+
+
+def run_export() -> None:
+    parser = argparse.ArgumentParser(description="Export the corpus to Parquet.")
+    parser.add_argument("--folder", default=SNAPSHOT_FOLDER)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    export_corpus(args.folder)
+    logger.info(f"✅ Snapshot written in {time.perf_counter() - start:.1f}s")
+
+
+def run_import() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild the SQLite DB (and the embeddings) from a Parquet snapshot."
+    )
+    parser.add_argument("--folder", default=SNAPSHOT_FOLDER)
+    parser.add_argument(
+        "--embeddings", action="store_true", help="Also rebuild the ChromaDB index"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    import_corpus(args.folder)
+    logger.info(f"✅ SQLite DB rebuilt in {time.perf_counter() - start:.1f}s")
+
+    if args.embeddings:
+        corpus = load_corpus(args.folder)
+        documents = ingredient_documents(corpus["recipes"], corpus["ingredients"])
+        index_documents(
+            [str(recipe_id) for recipe_id in documents.index], list(documents)
+        )
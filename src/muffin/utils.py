@@ -1,5 +1,20 @@
+import re
 import unicodedata
 
+# Words that make a prompt more than a plain list of ingredients
+CUSTOM_PROMPT_KEYWORDS = {
+    "sans",
+    "pas",
+    "remplacer",
+    "remplace",
+    "comment",
+    "pourquoi",
+    "combien",
+    "vegan",
+    "vegetarien",
+    "?",
+}
+
 
 def fraction_to_float(value_str: str) -> float:
     """
@@ -23,3 +38,32 @@ def normalize_text(text: str) -> str:
         c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn"
     )
     return text
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Met en minuscules et compacte les espaces, pour servir de clé de cache."""
+    return " ".join(prompt.lower().split())
+
+
+def classify_prompt(prompt: str) -> str:
+    """
+    Classe un prompt : "ingredients" pour une simple liste d'ingrédients,
+    "custom" dès que l'utilisateur pose une question ou une contrainte.
+    """
+    words = re.findall(r"\w+|\?", normalize_text(prompt))
+    if any(word in CUSTOM_PROMPT_KEYWORDS for word in words):
+        return "custom"
+    return "ingredients"
+
+
+def trim_history(
+    messages: list[dict[str, str]], max_turns: int
+) -> list[dict[str, str]]:
+    """
+    Garde le message système, le premier échange et les max_turns derniers
+    échanges (question + réponse) d'une conversation.
+    """
+    head, tail = messages[:3], messages[3:]
+    if len(tail) <= 2 * max_turns:
+        return list(messages)
+    return head + tail[len(tail) - 2 * max_turns :]
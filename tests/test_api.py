@@ -0,0 +1,122 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from muffin import api
+from muffin.api import app, server_sent_event
+from muffin.main import Retrieval
+from muffin.query_log import QueryLogEntry
+from muffin.recipe import Recipe, Servings, ServingUnit
+
+RECIPE = Recipe(
+    id=42,
+    title="Muffins test",
+    prep_time=10,
+    cook_time=20,
+    total_time=30,
+    servings=Servings(quantity=6, unit=ServingUnit.pieces),
+    ingredients=[],
+    instructions=[],
+)
+
+
+def fake_retrieve_recipe(user_prompt, n_results=1):
+    return Retrieval(
+        recipe=RECIPE,
+        recipe_ids=[42, 7][:n_results],
+        distances=[0.1, 0.2][:n_results],
+        latency_ms=5.0,
+    )
+
+
+def parse_events(body: str) -> list[tuple[str, object]]:
+    events = []
+    for block in body.strip("\n").split("\n\n"):
+        event, data = block.split("\n")
+        events.append(
+            (event.removeprefix("event: "), json.loads(data.removeprefix("data: ")))
+        )
+    return events
+
+
+def test_server_sent_event():
+    event = server_sent_event("token", "Yo, la crème brûlée")
+
+    assert event.endswith("\n\n")
+    lines = event.strip("\n").split("\n")
+    assert lines[0] == "event: token"
+    assert json.loads(lines[1].removeprefix("data: ")) == "Yo, la crème brûlée"
+
+
+def test_server_sent_event_multiline_data():
+    # json.dumps escapes newlines, a token never breaks the event framing
+    event = server_sent_event("token", "ligne 1\nligne 2")
+
+    assert event.count("\n") == 3
+
+
+def test_recipe_not_found(monkeypatch):
+    def get_recipe_by_id(recipe_id):
+        raise ValueError(f"Recipe {recipe_id} not found")
+
+    monkeypatch.setattr(api, "get_recipe_by_id", get_recipe_by_id)
+    # Without the context manager the lifespan (ChromaDB, embedding model) is skipped
+    client = TestClient(app)
+
+    response = client.get("/recipes/42")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Recipe 42 not found"}
+
+
+def test_search(monkeypatch):
+    monkeypatch.setattr(api, "retrieve_recipe", fake_retrieve_recipe)
+    client = TestClient(app)
+
+    response = client.get("/search", params={"q": "  Chocolat, Banane ", "n": 2})
+
+    assert response.status_code == 200
+    assert response.json()["recipe"]["title"] == "Muffins test"
+    assert response.json()["recipe_ids"] == [42, 7]
+
+
+def test_search_empty_query(monkeypatch):
+    monkeypatch.setattr(api, "retrieve_recipe", fake_retrieve_recipe)
+    client = TestClient(app)
+
+    assert client.get("/search", params={"q": "  "}).status_code == 422
+
+
+def test_generate(monkeypatch):
+    def generate_answer_stream(user_prompt, recipe, log_entry):
+        log_entry.generation_ms = 12.0
+        yield "Yo"
+        yield " les muffins"
+
+    logged: list[QueryLogEntry] = []
+    monkeypatch.setattr(api, "retrieve_recipe", fake_retrieve_recipe)
+    monkeypatch.setattr(api, "generate_answer_stream", generate_answer_stream)
+    monkeypatch.setattr(api, "log_query", logged.append)
+    client = TestClient(app)
+
+    response = client.post("/generate", json={"prompt": "chocolat"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert [event for event, _ in events] == ["recipe", "token", "token", "done"]
+    assert events[0][1] == {"id": 42, "title": "Muffins test"}
+    assert "".join(data for event, data in events if event == "token") == (
+        "Yo les muffins"
+    )
+
+    assert len(logged) == 1
+    assert logged[0].recipe_ids == [42]
+    assert logged[0].generation_ms == 12.0
+    assert logged[0].total_ms == events[-1][1]["total_ms"]
+
+
+def test_generate_empty_prompt():
+    client = TestClient(app)
+
+    assert client.post("/generate", json={"prompt": " "}).status_code == 422
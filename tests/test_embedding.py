@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from muffin import embedding
+from muffin.constant import EMBEDDING_BACKEND
+from muffin.embedding import (
+    SentenceTransformerEmbeddingFunction,
+    length_sorted_batches,
+    load_embedding_model,
+    topk_indices,
+)
+
+
+def test_invalid_backend():
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        SentenceTransformerEmbeddingFunction(backend="tensorflow")
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        load_embedding_model("tensorflow")
+
+
+class FakeSentenceTransformer:
+    loads = 0
+
+    def __init__(self, *args, **kwargs) -> None:
+        FakeSentenceTransformer.loads += 1
+
+
+def test_embedding_model_loaded_once(monkeypatch):
+    monkeypatch.setattr(embedding, "SentenceTransformer", FakeSentenceTransformer)
+    monkeypatch.setattr(embedding, "get_tokenizer", lambda: None)
+    monkeypatch.setattr(FakeSentenceTransformer, "loads", 0)
+    embedding._load_embedding_model.cache_clear()
+
+    # The API warms up without argument, the embedding function passes its backend
+    model = load_embedding_model()
+    assert load_embedding_model(EMBEDDING_BACKEND) is model
+    assert load_embedding_model(backend=EMBEDDING_BACKEND) is model
+    assert FakeSentenceTransformer.loads == 1
+
+    embedding._load_embedding_model.cache_clear()
+
+
+class FakeModel:
+    def __init__(self) -> None:
+        self.inputs: list[list[str]] = []
+
+    def encode(self, input: list[str], batch_size: int) -> np.ndarray:
+        self.inputs.append(input)
+        return np.zeros((len(input), 2))
+
+
+def test_e5_prefixes(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(embedding, "load_embedding_model", lambda backend: model)
+    embedding_function = SentenceTransformerEmbeddingFunction()
+
+    embedding_function(["farine, sucre"])
+    embedding_function.embed_query(["chocolat"])
+    assert model.inputs == [["passage: farine, sucre"], ["query: chocolat"]]
+
+
+def test_without_e5_prefixes(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(embedding, "load_embedding_model", lambda backend: model)
+    embedding_function = SentenceTransformerEmbeddingFunction(use_prefixes=False)
+
+    embedding_function(["farine, sucre"])
+    embedding_function.embed_query(["chocolat"])
+    assert model.inputs == [["farine, sucre"], ["chocolat"]]
+
+
+def test_length_sorted_batches():
+    documents = ["ccc", "a", "dddd", "bb", "eeeee"]
+    batches = length_sorted_batches(documents, batch_size=2)
+    assert batches == [[1, 3], [0, 2], [4]]
+
+
+def test_topk_indices():
+    queries = np.array([[1.0, 0.0], [0.0, 2.0]])
+    documents = np.array([[0.0, 1.0], [3.0, 0.1], [1.0, 1.0]])
+    assert topk_indices(queries, documents, k=2).tolist() == [[1, 2], [0, 2]]
@@ -0,0 +1,34 @@
+import chromadb
+import pytest
+
+from muffin import main
+from muffin.constant import COLLECTION_NAME
+from muffin.embedding import (
+    PREFIXED_METADATA_KEY,
+    SentenceTransformerEmbeddingFunction,
+)
+
+
+@pytest.mark.parametrize(
+    "metadata, use_prefixes",
+    [
+        ({PREFIXED_METADATA_KEY: True}, True),
+        ({PREFIXED_METADATA_KEY: False}, False),
+        # Indexes built before the e5 prefixes have no metadata
+        (None, False),
+    ],
+)
+def test_get_collection_prefixes(tmp_path, monkeypatch, metadata, use_prefixes):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    client.create_collection(
+        COLLECTION_NAME,
+        embedding_function=SentenceTransformerEmbeddingFunction(),
+        metadata=metadata,
+    )
+    monkeypatch.setattr(main, "CHROMADB_PATH", str(tmp_path))
+    main.get_collection.cache_clear()
+
+    collection = main.get_collection()
+
+    assert collection._embedding_function.use_prefixes is use_prefixes
+    main.get_collection.cache_clear()
@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from muffin import models
+from muffin.models import Base, get_pregenerated_answer, save_pregenerated_answer
+
+
+def test_pregenerated_answer_without_table(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recipes.db'}")
+    monkeypatch.setattr(models, "SessionLocal", sessionmaker(bind=engine))
+
+    assert get_pregenerated_answer(42, "ingredients") is None
+
+
+def test_pregenerated_answer(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recipes.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(models, "SessionLocal", sessionmaker(bind=engine))
+
+    save_pregenerated_answer(42, "ingredients", "Yo", version=1)
+    save_pregenerated_answer(42, "ingredients", "Yo yo", version=1)
+
+    assert get_pregenerated_answer(42, "ingredients", version=1) == "Yo yo"
+    assert get_pregenerated_answer(42, "custom", version=1) is None
+    assert get_pregenerated_answer(42, "ingredients", version=2) is None
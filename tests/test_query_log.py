@@ -0,0 +1,48 @@
+from muffin.query_log import (
+    QueryLogEntry,
+    QueryLogger,
+    hit_ratios,
+    latency_percentiles,
+    load_query_log,
+    top_queries,
+    top_recipe_ids,
+)
+
+
+def test_query_logger(tmp_path):
+    url = f"sqlite:///{tmp_path / 'query_log.db'}"
+    query_logger = QueryLogger(url=url, batch_size=2)
+    for prompt, recipe_id, prefetch_hit in [
+        ("chocolat, banane", 1, True),
+        ("chocolat, banane", 1, False),
+        ("myrtilles", 2, False),
+    ]:
+        query_logger.log(
+            QueryLogEntry(
+                prompt=prompt,
+                recipe_ids=[recipe_id],
+                distances=[0.1],
+                retrieval_ms=10.0,
+                prefetch_hit=prefetch_hit,
+            )
+        )
+    query_logger.log(
+        QueryLogEntry(
+            prompt="et sans oeufs ?",
+            kind="follow_up",
+            recipe_ids=[2],
+            distances=[0.1],
+            generation_ms=100.0,
+        )
+    )
+    query_logger.close()
+
+    query_log = load_query_log(url)
+    assert len(query_log) == 4
+    assert query_log["recipe_ids"].tolist() == [[1], [1], [2], [2]]
+    assert top_queries(query_log).to_dict() == {"chocolat, banane": 2, "myrtilles": 1}
+    assert top_recipe_ids(query_log, n=1) == [1]
+    assert top_recipe_ids(query_log, n=2) == [1, 2]
+    assert hit_ratios(query_log)["prefetch_hit"] == 1 / 3
+    percentiles = latency_percentiles(query_log, percentiles=(0.5,))
+    assert percentiles.loc[("search", 0.5), "retrieval_ms"] == 10.0
@@ -0,0 +1,132 @@
+import chromadb
+import pandas as pd
+import pytest
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from muffin import models
+from muffin.constant import COLLECTION_NAME
+from muffin.embedding import PREFIXED_METADATA_KEY
+from muffin.models import (
+    Base,
+    IngredientModel,
+    InstructionModel,
+    PregeneratedAnswerModel,
+    RecipeModel,
+    ServingsModel,
+    index_documents,
+)
+from muffin.snapshot import export_corpus, import_corpus, ingredient_documents
+
+
+def test_snapshot_round_trip(tmp_path):
+    source = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    Base.metadata.create_all(source)
+    with Session(source) as session:
+        recipe = RecipeModel(
+            id=42, title="Muffins test", prep_time=10, cook_time=20, total_time=30
+        )
+        recipe.servings = ServingsModel(quantity=6, unit="pieces")
+        recipe.ingredients = [
+            IngredientModel(name="farine", quantity=200.0, unit="g"),
+            IngredientModel(name="oeufs", quantity=2.0, unit=None),
+        ]
+        recipe.instructions = [InstructionModel(text="Mélanger.", order=0)]
+        session.add(recipe)
+        session.commit()
+
+    export_corpus(str(tmp_path / "snapshot"), engine=source)
+    target = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    import_corpus(str(tmp_path / "snapshot"), engine=target)
+
+    for table in ["recipes", "servings", "ingredients", "instructions"]:
+        pd.testing.assert_frame_equal(
+            pd.read_sql_table(table, source), pd.read_sql_table(table, target)
+        )
+
+
+def test_ingredient_documents():
+    recipes = pd.DataFrame({"id": [1, 2, 3]})
+    ingredients = pd.DataFrame(
+        {
+            "id": [3, 1, 2],
+            "recipe_id": [1, 1, 2],
+            "name": pd.Categorical(["sucre", "farine", "beurre"]),
+        }
+    )
+    documents = ingredient_documents(recipes, ingredients)
+    assert documents.to_dict() == {1: "farine, sucre", 2: "beurre", 3: ""}
+
+
+def test_import_clears_pregenerated_answers(tmp_path):
+    source = create_engine(f"sqlite:///{tmp_path / 'source.db'}")
+    Base.metadata.create_all(source)
+    with Session(source) as session:
+        session.add(
+            RecipeModel(
+                id=42, title="Muffins test", prep_time=10, cook_time=20, total_time=30
+            )
+        )
+        session.add(
+            PregeneratedAnswerModel(
+                recipe_id=42, prompt_class="ingredients", version=1, content="Yo"
+            )
+        )
+        session.commit()
+
+    export_corpus(str(tmp_path / "snapshot"), engine=source)
+    import_corpus(str(tmp_path / "snapshot"), engine=source)
+
+    assert pd.read_sql_table("pregenerated_answers", source).empty
+    assert pd.read_sql_table("recipes", source)["id"].tolist() == [42]
+
+
+class FakeEmbeddingFunction(EmbeddingFunction):
+    use_prefixes = True
+    batch_size = 2
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if any(text.startswith("boom") for text in input):
+            raise RuntimeError("Encoding failed")
+        return [[float(len(text)), 1.0] for text in input]
+
+
+def test_index_documents_drops_removed_recipes(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "CHROMADB_PATH", str(tmp_path / "chromadb"))
+    monkeypatch.setattr(
+        models, "SentenceTransformerEmbeddingFunction", FakeEmbeddingFunction
+    )
+
+    index_documents(["1", "2", "3"], ["farine", "sucre", "beurre"])
+    # The new snapshot no longer has recipe 2
+    index_documents(["1", "3"], ["farine", "beurre, sel"])
+
+    client = chromadb.PersistentClient(path=str(tmp_path / "chromadb"))
+    collection = client.get_collection(COLLECTION_NAME)
+    indexed = collection.get()
+    assert sorted(indexed["ids"]) == ["1", "3"]
+    assert dict(zip(indexed["ids"], indexed["documents"]))["3"] == "beurre, sel"
+    assert collection.metadata == {PREFIXED_METADATA_KEY: True}
+
+
+def test_index_documents_keeps_index_on_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "CHROMADB_PATH", str(tmp_path / "chromadb"))
+    monkeypatch.setattr(
+        models, "SentenceTransformerEmbeddingFunction", FakeEmbeddingFunction
+    )
+    index_documents(["1", "2"], ["farine", "sucre"])
+    client = chromadb.PersistentClient(path=str(tmp_path / "chromadb"))
+    live = client.get_collection(COLLECTION_NAME)
+
+    # The longest document, so it fails on the last batch once the first is added
+    with pytest.raises(RuntimeError, match="Encoding failed"):
+        index_documents(["1", "2", "3"], ["farine", "sucre", "boom, boom, boom"])
+
+    assert sorted(live.get()["ids"]) == ["1", "2"]
+
+    index_documents(["3"], ["beurre"])
+    assert [collection.name for collection in client.list_collections()] == [
+        COLLECTION_NAME
+    ]
+    assert client.get_collection(COLLECTION_NAME).get()["ids"] == ["3"]
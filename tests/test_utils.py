@@ -1,4 +1,10 @@
-from muffin.utils import fraction_to_float, normalize_text
+from muffin.utils import (
+    classify_prompt,
+    fraction_to_float,
+    normalize_prompt,
+    normalize_text,
+    trim_history,
+)
 
 
 def test_fraction_to_float():
@@ -17,3 +23,34 @@ def test_fraction_to_float():
 
 def test_normalize_text():
     assert normalize_text("EnlèvE Moi ToUt ça") == "enleve moi tout ca"
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  Chocolat,   Banane \n") == "chocolat, banane"
+
+
+def test_classify_prompt():
+    assert classify_prompt("Chocolat, banane") == "ingredients"
+    assert classify_prompt("myrtilles et citron") == "ingredients"
+    assert classify_prompt("chocolat sans œufs") == "custom"
+    assert classify_prompt("Comment faire des muffins ?") == "custom"
+
+
+def test_trim_history():
+    messages = [{"role": "system", "content": "recette"}]
+    for turn in range(5):
+        messages.append({"role": "user", "content": f"question {turn}"})
+        messages.append({"role": "assistant", "content": f"réponse {turn}"})
+
+    trimmed = trim_history(messages, max_turns=2)
+    assert [message["content"] for message in trimmed] == [
+        "recette",
+        "question 0",
+        "réponse 0",
+        "question 3",
+        "réponse 3",
+        "question 4",
+        "réponse 4",
+    ]
+    assert trim_history(messages, max_turns=4) == messages
+    assert trim_history(messages, max_turns=0) == messages[:3]